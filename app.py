@@ -1,5 +1,8 @@
 import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import streamlit as st
 
 # ---------- Basic page setup ----------
@@ -11,39 +14,136 @@ WAITLIST_FILE = "waitlist.csv"
 MATCHES_FILE = "matches.csv"
 
 # ---------- Utility functions ----------
-@st.cache_data
-def load_csv(path: str) -> pd.DataFrame:
+def file_version(path: str) -> tuple:
+    # Full-precision mtime plus size, so a rewrite that lands on the same
+    # (rounded) mtime still counts as a new version of the file
+    if not os.path.exists(path):
+        return (0, 0)
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def csv_stamp(path: str) -> dict:
+    # Identifies the exact CSV a Parquet sidecar was written from
+    mtime_ns, size = file_version(path)
+    return {b"csv_mtime_ns": str(mtime_ns).encode(), b"csv_size": str(size).encode()}
+
+def sidecar_matches(path: str, parquet_path: str) -> bool:
+    # Use the sidecar only if it was written from the CSV as it is now, so a
+    # restored or hand-edited CSV always wins, whatever its mtime
+    if not os.path.exists(parquet_path):
+        return False
+    metadata = pq.read_schema(parquet_path).metadata or {}
+    return all(metadata.get(key) == value for key, value in csv_stamp(path).items())
+
+def is_text_dtype(dtype) -> bool:
+    if isinstance(dtype, pd.ArrowDtype):
+        arrow_type = dtype.pyarrow_dtype
+        return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type) or pa.types.is_null(arrow_type)
+    return isinstance(dtype, pd.StringDtype) or dtype == object
+
+@st.cache_data(ttl=600, max_entries=8, show_spinner=False)
+def load_csv(path: str, version: tuple) -> pd.DataFrame:
+    # version is unused here; it is part of the cache key so each file's
+    # entry is invalidated only when that file changes
     if not os.path.exists(path):
         return pd.DataFrame()
-    try:
-        df = pd.read_csv(path)
-    except pd.errors.EmptyDataError:
-        return pd.DataFrame()
+    parquet_path = path + ".parquet"
+    if sidecar_matches(path, parquet_path):
+        df = pd.read_parquet(parquet_path, dtype_backend="pyarrow")
+    else:
+        try:
+            df = pd.read_csv(path, engine="pyarrow", dtype_backend="pyarrow")
+        except pd.errors.ParserError:
+            # pyarrow rejects header-only files without a trailing newline
+            df = None
+        # pyarrow also keeps blank headers as "" and duplicate headers as-is,
+        # where the C parser names them "Unnamed: N" and "a.1"; let the C
+        # parser handle those files (or raise EmptyDataError)
+        if df is None or (df.columns == "").any() or df.columns.duplicated().any():
+            try:
+                df = pd.read_csv(path, dtype_backend="pyarrow")
+            except pd.errors.EmptyDataError:
+                return pd.DataFrame()
     df = df.loc[:, ~df.columns.str.contains("^Unnamed")]
+    # Text comes back as Arrow string from CSV, large_string from Parquet,
+    # null for all-empty columns (which can't hold values typed in the
+    # editor later) and object from header-only files; settle on one type so
+    # dtypes don't change after the first save
+    text_cols = [col for col, dtype in df.dtypes.items() if is_text_dtype(dtype)]
+    df = df.astype({col: pd.ArrowDtype(pa.string()) for col in text_cols})
     return df
 
+def load(path: str) -> pd.DataFrame:
+    return load_csv(path, file_version(path))
+
+def has_ready_date(ready: pd.Series) -> pd.Series:
+    # Non-null, non-empty check by length, without a stripped copy of the column
+    return ready.notna() & (ready.astype("string").str.len() > 0)
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def get_notices(version: tuple) -> pd.DataFrame:
+    # Units with a Ready Date; recomputed only when units.csv changes
+    df = load_csv(UNITS_FILE, version)
+    return df.loc[has_ready_date(df["Ready Date"]), ["Unit", "Ready Date"]]
+
 def save_csv(df: pd.DataFrame, path: str):
+    # pandas keeps the hand-edited CSVs in their existing unquoted format
     df.to_csv(path, index=False)
-    load_csv.clear()
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed-type columns can't go to Arrow; any older sidecar no longer
+        # matches the CSV and is ignored
+        return
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **csv_stamp(path)})
+    pq.write_table(table, path + ".parquet")
 
 def global_search_filter(df: pd.DataFrame, search_query: str) -> pd.DataFrame:
     if not search_query or df.empty:
         return df
-    mask = pd.Series([False] * len(df))
-    for col in df.columns:
-        mask = mask | df[col].astype(str).str.contains(search_query, case=False, na=False)
+    # Join every column into one string per row and scan it once; the unit
+    # separator keeps a match from spanning two adjacent cells. Empty cells
+    # become "" so they don't turn the whole joined row into NA
+    cells = df.astype("string").fillna("")
+    combined = cells.iloc[:, 0]
+    for col in cells.columns[1:]:
+        combined = combined.str.cat(cells[col], sep="\x1f")
+    # Lowercase haystack and needle once so the scan is a plain literal match
+    mask = combined.str.lower().str.contains(search_query.lower(), regex=False, na=False)
     return df[mask]
 
 # ---------- Matching logic ----------
+def factorize_shared(unit_values: pd.Series, *applicant_values: pd.Series) -> list:
+    """Label-encode unit and applicant columns against one shared vocabulary.
+
+    Missing values get a different code on each side so they never compare
+    equal. For Floor this is a change from the old per-pair str() comparison,
+    where a blank Floor on both sides matched as "nan" == "nan".
+    """
+    codes, _ = pd.factorize(pd.concat([unit_values, *applicant_values], ignore_index=True))
+    codes = codes.astype(np.int32)
+    unit_codes = codes[:len(unit_values)]
+    applicant_codes = np.split(codes[len(unit_values):], np.cumsum([len(v) for v in applicant_values])[:-1])
+    for a in applicant_codes:
+        a[a == -1] = -2
+    return [unit_codes, *applicant_codes]
+
+def floor_key(floor: pd.Series) -> pd.Series:
+    # Floors compare as stripped text; blank floors are missing and never match
+    floor = floor.astype("string").str.strip()
+    return floor.mask(floor == "")
+
 def run_matching_logic(units_df: pd.DataFrame, waitlist_df: pd.DataFrame, priorities: list) -> pd.DataFrame:
 
+    # Without priorities every unit scores 0, so there is nothing to rank
+    if not priorities:
+        return pd.DataFrame()
+
     # Only include units with Ready Date
     units_df = units_df[units_df["Ready Date"].astype(str).str.strip() != ""]
     if units_df.empty or waitlist_df.empty:
         return pd.DataFrame()
 
-    matches = []
-
     # Priority weights: 100, 10, 1
     priority_weights = {
         priorities[i]: 10 ** (len(priorities) - i - 1)
@@ -57,48 +157,77 @@ def run_matching_logic(units_df: pd.DataFrame, waitlist_df: pd.DataFrame, priori
         "Floor Plan 3": 25
     }
 
-    for _, applicant in waitlist_df.iterrows():
-        best_score = -1
-        best_unit = None
-
-        for _, unit in units_df.iterrows():
-            score = 0
-
-            for field in priorities:
-
-                # ---------- Floor Plan (special logic) ----------
-                if field == "Floor Plan":
-                    if unit["Floor Plan"] == applicant["Floor Plan 1"]:
-                        score += fp_weights["Floor Plan 1"] * priority_weights[field]
-                    elif unit["Floor Plan"] == applicant["Floor Plan 2"]:
-                        score += fp_weights["Floor Plan 2"] * priority_weights[field]
-                    elif unit["Floor Plan"] == applicant["Floor Plan 3"]:
-                        score += fp_weights["Floor Plan 3"] * priority_weights[field]
-
-                # ---------- Floor ----------
-                elif field == "Floor":
-                    if str(unit["Floor"]).strip() == str(applicant["Floor"]).strip():
-                        score += priority_weights[field]
-
-                # ---------- Direction ----------
-                elif field == "Direction":
-                    if unit["Direction"] == applicant["Direction"]:
-                        score += priority_weights[field]
-
-            if score > best_score:
-                best_score = score
-                best_unit = unit
-
-        if best_unit is not None:
-            matches.append({
-                "Applicant": applicant["Applicant"],
-                "Unit": best_unit["Unit"],
-                "Score": best_score,
-                "Floor Plan Match": best_unit["Floor Plan"],
-                "Ready Date": best_unit["Ready Date"]
-            })
-
-    return pd.DataFrame(matches)
+    # Resolve weights once; a field left out of the priorities weighs 0
+    w_fp = priority_weights.get("Floor Plan", 0)
+    w_fl = priority_weights.get("Floor", 0)
+    w_dir = priority_weights.get("Direction", 0)
+    fpw1 = fp_weights["Floor Plan 1"] * w_fp
+    fpw2 = fp_weights["Floor Plan 2"] * w_fp
+    fpw3 = fp_weights["Floor Plan 3"] * w_fp
+
+    # Compare int codes rather than Python strings; unit codes broadcast as
+    # row vectors against applicant column vectors into an
+    # (applicants x units) score matrix. Each field's columns are only read
+    # when that field is selected
+    score = np.zeros((len(waitlist_df), len(units_df)), dtype=np.int64)
+    applicant_rows = np.arange(len(waitlist_df))
+
+    # ---------- Floor Plan (special logic) ----------
+    if w_fp:
+        u_fp, a_fp1, a_fp2, a_fp3 = factorize_shared(
+            units_df["Floor Plan"],
+            waitlist_df["Floor Plan 1"],
+            waitlist_df["Floor Plan 2"],
+            waitlist_df["Floor Plan 3"]
+        )
+        # Lookup table: fp_pref[i, code] is what applicant i scores a unit
+        # with that plan. Filling 3rd choice first lets a higher choice
+        # overwrite it; the extra last column stays 0 for units with no plan
+        n_plans = max(u_fp.max(), a_fp1.max(), a_fp2.max(), a_fp3.max()) + 1
+        fp_pref = np.zeros((len(waitlist_df), n_plans + 1), dtype=np.int64)
+        for codes, weight in ((a_fp3, fpw3), (a_fp2, fpw2), (a_fp1, fpw1)):
+            listed = codes >= 0
+            fp_pref[applicant_rows[listed], codes[listed]] = weight
+        score += fp_pref[:, u_fp]
+
+    # ---------- Floor ----------
+    if w_fl:
+        u_floor, a_floor = factorize_shared(floor_key(units_df["Floor"]), floor_key(waitlist_df["Floor"]))
+        score += w_fl * (u_floor[None, :] == a_floor[:, None])
+
+    # ---------- Direction ----------
+    if w_dir:
+        u_dir, a_dir = factorize_shared(units_df["Direction"], waitlist_df["Direction"])
+        score += w_dir * (u_dir[None, :] == a_dir[:, None])
+
+    # argmax returns the first best unit, same tie-break as a strict ">" scan
+    best = score.argmax(axis=1)
+    best_units = units_df.iloc[best]
+
+    return pd.DataFrame({
+        "Applicant": waitlist_df["Applicant"].to_numpy(),
+        "Unit": best_units["Unit"].to_numpy(),
+        "Score": score[applicant_rows, best],
+        "Floor Plan Match": best_units["Floor Plan"].to_numpy(),
+        "Ready Date": best_units["Ready Date"].to_numpy()
+    })
+
+# ---------- Search panels ----------
+# Fragments so typing in a search box reruns only that panel, not the page
+
+@st.fragment
+def notices_panel():
+    notices_df = get_notices(file_version(UNITS_FILE))
+    search_query = st.text_input("Search", "", key="notices_search")
+    notices_filtered = global_search_filter(notices_df, search_query)
+    st.dataframe(notices_filtered, use_container_width=True)
+
+@st.fragment
+def matches_panel():
+    matches_df = load(MATCHES_FILE)
+    search_query = st.text_input("Search", "", key="matches_search")
+    matches_filtered = global_search_filter(matches_df, search_query)
+    st.dataframe(matches_filtered, use_container_width=True)
 
 # ---------- Main UI ----------
 st.title("Property Matcher")
@@ -109,7 +238,7 @@ tabs = st.tabs(["Units", "Notices", "Waitlist", "Matches", "Run Matching"])
 # ---------- Units Tab ----------
 with tabs[0]:
     st.subheader("Units")
-    units_df = load_csv(UNITS_FILE)
+    units_df = load(UNITS_FILE)
     edited_df = st.data_editor(units_df, use_container_width=True, num_rows="dynamic")
     if st.button("Save Units", type="primary"):
         save_csv(edited_df, UNITS_FILE)
@@ -119,20 +248,13 @@ with tabs[0]:
 # ---------- Notices Tab ----------
 with tabs[1]:
     st.subheader("Notices")
-    units_df = load_csv(UNITS_FILE)
-    notices_df = units_df[
-    units_df["Ready Date"].fillna("").astype(str).str.strip() != ""
-]
-    notices_df = notices_df[["Unit", "Ready Date"]]
-    search_query = st.text_input("Search", "", key="notices_search")
-    notices_filtered = global_search_filter(notices_df, search_query)
-    st.dataframe(notices_filtered, use_container_width=True)
+    notices_panel()
 
 # ---------- Waitlist Tab ----------
 with tabs[2]:
     st.subheader("Waitlist")
 
-    waitlist_df = load_csv(WAITLIST_FILE)
+    waitlist_df = load(WAITLIST_FILE)
 
     edited_waitlist = st.data_editor(
         waitlist_df,
@@ -148,10 +270,7 @@ with tabs[2]:
 # ---------- Matches Tab ----------
 with tabs[3]:
     st.subheader("Matches")
-    matches_df = load_csv(MATCHES_FILE)
-    search_query = st.text_input("Search", "", key="matches_search")
-    matches_filtered = global_search_filter(matches_df, search_query)
-    st.dataframe(matches_filtered, use_container_width=True)
+    matches_panel()
 
 # ---------- Run Matching Tab ----------
 with tabs[4]:
@@ -168,13 +287,13 @@ with tabs[4]:
     run_button = st.button("Run Matching", type="primary")
 
     if run_button:
-        units_df = load_csv(UNITS_FILE)
-        waitlist_df = load_csv(WAITLIST_FILE)
-
+        # units_df / waitlist_df were loaded by the tabs above in this same run
         if units_df.empty:
             st.warning("Units data is empty.")
         elif waitlist_df.empty:
             st.warning("Waitlist is empty.")
+        elif not priorities:
+            st.warning("Select at least one priority.")
         else:
             matches_df = run_matching_logic(units_df, waitlist_df, priorities)
             save_csv(matches_df, MATCHES_FILE)